@@ -5,7 +5,6 @@ import asyncio
 import logging
 import shutil
 import sys
-import subprocess
 import unicodedata
 import re
 import os
@@ -13,13 +12,11 @@ import time
 import pathlib
 import better_exceptions
 
+from concurrent.futures import ThreadPoolExecutor
 from pyhocon import ConfigTree
-from apscheduler.schedulers.asyncio import AsyncIOScheduler
-from apscheduler.job import Job as ApJob
 from asyncio.selector_events import BaseSelectorEventLoop
-from typing import Dict, Optional, List, Any
+from typing import Dict, Optional, List, Any, Tuple
 from sty import fg, ef, rs, Rule, Render
-from datetime import datetime, timedelta
 from async_timeout import timeout
 
 from .model_loader.model_loader import ModelLoader
@@ -38,8 +35,13 @@ fg.set_rule('csaopt_magenta', Rule(Render.rgb_fg, 199, 51, 147))
 
 # log.setLevel(logging.DEBUG)
 
+# The number of frames needs to be a power of two, the spinner index is advanced with a bit mask
+_spinner_frames: Tuple[str, ...] = ('◣', '◤', '◥', '◢')
+_spinner_mask = len(_spinner_frames) - 1
+# Width of the spinner status, i.e. a frame followed by 4 spaces
+_spinner_status_width = 5
+
 logging.getLogger('botocore').setLevel(logging.WARN)
-logging.getLogger('apscheduler.executors.default').setLevel(logging.WARN)
 
 
 class ConsolePrinter:
@@ -47,45 +49,44 @@ class ConsolePrinter:
     status_done = 'Done.'
     status_failed = 'Failed.'
     __ANSI_escape_re = re.compile(r'[\x1B|\x1b]\[[0-?]*[ -/]*[@-~]')
+    # C0 and C1 control chars, the only unicode control chars (category C*) that can appear in ascii text
+    __control_chars_re = re.compile(r'[\x00-\x1f\x7f-\x9f]')
 
     def __init__(self, internal_config, log_level='info') -> None:
         self.spinner_idx = 0
-        self.termsize = shutil.get_terminal_size((80, 20))
         self.last_line: str = ''
-        self.has_scheduled_print: bool = False
-        self.print_job: Optional[ApJob] = None
-        self.scheduler: AsyncIOScheduler = AsyncIOScheduler()
-        self.scheduler.start()
-        self.spinner: List[str] = ['◣', '◤', '◥', '◢']
+        # Text of the current spinner line, last_line changes with every print while the spinner is active
+        self._spinner_text: str = ''
+        self._spinner_task: Optional[asyncio.Task] = None
         self.log_level = log_level
+        # Spinners and padding only make sense in a terminal, piped output (e.g. CI logs) gets plain lines
+        self._interactive: bool = sys.stdout.isatty() and log_level == 'info'
 
         max_columns = internal_config.get('console.width_max')
-        self.columns = internal_config.get('console.width_default')
-
-        try:
-            _, columns = subprocess.check_output(['stty', 'size']).split()
-            if int(columns) < max_columns:
-                self.columns = columns
-        except Exception:
-            log.exception('Could not get stty size, it seems there is no console available.')
+        # This honors $COLUMNS and falls back to the configured default width if no terminal is attached
+        self.termsize = shutil.get_terminal_size((internal_config.get('console.width_default'), 20))
+        self.columns: int = min(self.termsize.columns, max_columns)
 
     @staticmethod
     def _format_to_width(width: int, txt: str, status: str) -> str:
         txt_len = len(ConsolePrinter._remove_special_seqs(txt))
         status_len = len(ConsolePrinter._remove_special_seqs(status))
+        pad = width - status_len
         if (txt_len + status_len) > width:
-            return txt[0:(width - status_len - 4)] + '... ' + status
+            return txt[0:(pad - 4)] + '... ' + status
 
-        return txt + ''.join([' '] * (width - status_len - txt_len)) + status
+        # ljust counts escape sequences as well, so these are added on top of the visible width
+        return txt.ljust(pad + len(txt) - txt_len) + status
 
     @staticmethod
     def _remove_special_seqs(s):
-        no_ansi = ConsolePrinter.__ANSI_escape_re.sub('', s)
-        no_c = ''.join(c for c in no_ansi if unicodedata.category(c)[0] != 'C')
-        return no_c
+        no_c = ConsolePrinter.__control_chars_re.sub('', ConsolePrinter.__ANSI_escape_re.sub('', s))
+        if no_c.isascii():
+            return no_c
+        return ''.join(c for c in no_c if unicodedata.category(c)[0] != 'C')
 
     def _advance_spinner(self):
-        self.spinner_idx = (self.spinner_idx + 1) % len(self.spinner)
+        self.spinner_idx = (self.spinner_idx + 1) & _spinner_mask
 
     def print(self, txt: str) -> None:
         self._advance_spinner()
@@ -99,43 +100,50 @@ class ConsolePrinter:
     def print_magenta(self, txt: str) -> None:
         self.print(fg.csaopt_magenta + txt)
 
+    async def _spin(self, txt: str) -> None:
+        # Only the spinner glyph changes between frames, so the padded text is formatted once, using a placeholder
+        # of the same width as the spinner status, which is then cut off again.
+        line = ConsolePrinter._format_to_width(self.columns, txt,
+                                               ' ' * _spinner_status_width)[:-_spinner_status_width]
+        while True:
+            self.print('\r' + line + fg.csaopt_magenta + _spinner_frames[self.spinner_idx] + '    ')
+            await asyncio.sleep(0.42)
+
+    def _stop_spinner(self) -> None:
+        if self._spinner_task is not None:
+            self._spinner_task.cancel()
+            self._spinner_task = None
+
     def print_with_spinner(self, txt: str) -> None:
-        self.scheduler.remove_all_jobs()
-        self.last_line = txt
+        """Prints txt followed by a spinner, which is animated until spinner_success/failure is called
 
-        self.print_job = self.scheduler.add_job(
-            lambda: self.print('\r' + ConsolePrinter._format_to_width(
-                self.columns,
-                txt,
-                fg.csaopt_magenta + self.spinner[self.spinner_idx] + '    ')),
-            'interval',
-            seconds=0.42,
-            id='print_job',
-            max_instances=1,
-            next_run_time=datetime.now() + timedelta(milliseconds=50))  # run in 50ms, then periodically
+        This needs to be called while the event loop is running.
+        """
+        self._stop_spinner()
+        self._spinner_text = txt
+        if self._interactive:
+            self._spinner_task = asyncio.ensure_future(self._spin(txt))
+
+    def _finish_spinner(self, status: str, color: str) -> None:
+        self._stop_spinner()
+        # If log level < warn, just re-print with the status
+        if self.log_level != 'info':
+            return
+
+        txt = self._spinner_text
+        if not self._interactive:
+            self.println(txt + ' ' + status)
+            return
+
+        # Truncate to console width to fit message, the carriage return overwrites the spinner
+        self.println('\r' + ConsolePrinter._format_to_width(self.columns, txt[0:self.columns - len(status)],
+                                                             color + status))
 
     def spinner_success(self) -> None:
-        # If log level < warn, just re-print with 'Done.'
-        # Truncate to console width to fit message
-        if self.log_level == 'info':
-            if self.print_job is not None:
-                self.print_job.pause()
-                self.print_job.remove()
-            self.scheduler.remove_all_jobs()
-            self.println(
-                ConsolePrinter._format_to_width(self.columns,
-                                                self.last_line[0:self.columns - len(ConsolePrinter.status_done)],
-                                                fg.green + ConsolePrinter.status_done))
+        self._finish_spinner(ConsolePrinter.status_done, fg.green)
 
     def spinner_failure(self) -> None:
-        # If log level < warn, just re-print with 'Failed.'
-        # Truncate to console width to fit message
-        if self.log_level == 'info':
-            self.scheduler.remove_all_jobs()
-            self.println(
-                ConsolePrinter._format_to_width(self.columns,
-                                                self.last_line[0:self.columns - len(ConsolePrinter.status_failed)],
-                                                fg.red + ConsolePrinter.status_failed))
+        self._finish_spinner(ConsolePrinter.status_failed, fg.red)
 
 
 class Runner:
@@ -146,7 +154,8 @@ class Runner:
         self.conf_paths = conf_paths
         self.model_paths = model_paths
         self.invocation_options = invocation_options
-        self.loop = asyncio.get_event_loop()
+        # Used to parse configs and load models off the event loop. Threads are only started when needed.
+        self.executor = ThreadPoolExecutor(max_workers=max(1, min(8, len(conf_paths), len(model_paths))))
         self.models: List[Model] = []
         self.failures: List[str] = []
 
@@ -168,6 +177,16 @@ class Runner:
         else:
             raise AttributeError('Cloud platform ' + cloud_platform + ' unrecognized.')
 
+    @staticmethod
+    def _get_configs(conf_paths: List[str]) -> List[Optional[ConfigTree]]:
+        # pyhocon modifies pyparsing's global default whitespace while building its grammar, so configs must not be
+        # parsed concurrently
+        return [get_configs(conf_path) for conf_path in conf_paths]
+
+    @staticmethod
+    def _load_model(conf: ConfigTree, internal_conf: ConfigTree) -> Optional[Model]:
+        return ModelLoader(conf, internal_conf).get_model()
+
     def duplicate_remote_configs(self, configs):
         for config in configs:
             if config.get('remote', None) is not None:
@@ -179,11 +198,12 @@ class Runner:
         for config in configs:
             config['remote'] = remote_conf
 
-    async def _run_async(self, loop):
+    async def _run_async(self):
+        loop = asyncio.get_running_loop()
         printer = self.console_printer
         printer.print_with_spinner('Loading Config')
         try:
-            configs = [get_configs(conf_path) for conf_path in self.conf_paths]
+            configs = await loop.run_in_executor(self.executor, Runner._get_configs, self.conf_paths)
             self.duplicate_remote_configs(configs)
 
             internal_conf = self.invocation_options['internal_conf']
@@ -199,9 +219,13 @@ class Runner:
         for idx, model_path in enumerate(self.model_paths):
             configs[idx]['model']['path'] = model_path
             log.debug('Loading model {}'.format(model_path))
-            loader = ModelLoader(configs[idx], internal_conf)
-            self.models.insert(idx, loader.get_model())
-            log.debug('Models loaded succesfully.')
+        model_loads = [
+            loop.run_in_executor(self.executor, Runner._load_model, configs[idx], internal_conf)
+            for idx in range(len(self.model_paths))
+        ]
+        # Models are loaded in parallel, gather returns them in the order of model_paths
+        self.models = await asyncio.gather(*model_loads)
+        log.debug('Models loaded succesfully.')
         printer.spinner_success()
 
         # Get cloud config, create instance manager
@@ -215,7 +239,11 @@ class Runner:
         printer.print_with_spinner(start_msg)
         await asyncio.sleep(0.8)
 
-        with self._get_instance_manager(ctx, self.remote_config, internal_conf) as instancemanager:
+        # Provisioning and termination block for a long time, so they must not run on the event loop
+        instancemanager = self._get_instance_manager(ctx, self.remote_config, internal_conf)
+        await loop.run_in_executor(self.executor, instancemanager.__enter__)
+        exc_info: Tuple[Any, Any, Any] = (None, None, None)
+        try:
             log.debug('Entered instancemanager block')
             printer.spinner_success()
             printer.print_with_spinner('Waiting for broker to come online')
@@ -326,15 +354,27 @@ class Runner:
 
             printer.println('Waiting for instances to shutdown. This might take a long time. If you configured ' +
                             'files to be written to disk, they are now ready for your perusal.')
+        except BaseException:
+            exc_info = sys.exc_info()
+            raise
+        finally:
+            try:
+                await loop.run_in_executor(self.executor, instancemanager.__exit__, *exc_info)
+            except Exception:
+                if exc_info[0] is None:
+                    raise
+                # Don't hide the exception that got us here
+                log.exception('Error while shutting down instances')
 
     def run(self) -> None:
         """
 
         """
 
-        loop = asyncio.get_event_loop()
-        loop.run_until_complete(self._run_async(loop))
-        loop.close()
+        try:
+            asyncio.run(self._run_async())
+        finally:
+            self.executor.shutdown()
 
         if self.failures:
             self.console_printer.println(fg.red + 'It seems there have been errors. 🌩')
@@ -346,6 +386,9 @@ class Runner:
 
 
 class Context:
+
+    __slots__ = ('console_printer', 'configs', 'internal_config')
+
     def __init__(self, console_printer: ConsolePrinter, configs: ConfigTree, internal_config: ConfigTree) -> None:
         self.console_printer: ConsolePrinter = console_printer
         self.configs = configs
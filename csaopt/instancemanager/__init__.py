@@ -24,6 +24,8 @@ class Instance():
         kwargs: Any other keyword arguments will be passed to an internal `props` field
     """
 
+    __slots__ = ('_public_ip', 'port', 'inst_id', 'is_broker', 'props')
+
     def __init__(self, inst_id: str, public_ip: str, port=-1, is_broker: bool = False,
                  **kwargs: Dict[str, Any]) -> None:
         self.public_ip = public_ip
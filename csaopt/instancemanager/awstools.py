@@ -1,26 +1,35 @@
 import boto3
+import functools
 import logging
-import time
+import os
 
 from string import Template
 from pyhocon import ConfigTree
-from botocore.exceptions import ClientError
+from botocore.config import Config
+from botocore.exceptions import ClientError, WaiterError
 from typing import List, Any, Tuple, Dict
 
 from . import Instance
 from .instancemanager import InstanceManager
-from ..utils import random_str, random_int
+from ..utils import random_str, random_token
 
 log = logging.getLogger()
 
+# Polling interval for the EC2 waiters, in seconds
+_waiter_delay_s = 5
 
-def _interpolate_userscript_template_vals(script: bytes, **kwargs: str) -> bytes:
-    return Template(script.decode('utf-8')).substitute(kwargs).encode()
+
+@functools.lru_cache()
+def _read_userdata_script(path: str) -> bytes:
+    """Read a user-data script, caching its contents keyed by the absolute path of the script"""
+    with open(path, 'rb') as script:
+        return script.read()
 
 
-def _has_exit_status(instance) -> bool:
-    instance.reload()
-    return instance.state['Name'] == 'shutting-down' or instance.state['Name'] == 'terminated'
+# Note that boto3 base64-encodes UserData for RunInstances by itself, user-data must therefore be passed as plain bytes.
+# Pre-encoding the scripts would send them double-encoded.
+def _interpolate_userscript_template_vals(script: bytes, **kwargs: str) -> bytes:
+    return Template(script.decode('utf-8')).substitute(kwargs).encode()
 
 
 class AWSTools(InstanceManager):
@@ -51,17 +60,24 @@ class AWSTools(InstanceManager):
 
     def __init__(self, config: ConfigTree, internal_conf: ConfigTree) -> None:
         self.region = config.get('remote.aws.region', internal_conf['remote.aws.default_region'])
+        self.worker_count: int = config['remote.aws.worker_count']
+
+        # A single, sufficiently large connection pool lets all API calls and waiters re-use connections
+        boto_config = Config(
+            max_pool_connections=max(16, 2 * self.worker_count), retries={'max_attempts': 10, 'mode': 'adaptive'})
 
         if config.get('remote.aws.secret_key', False) and config.get('remote.aws.access_key', False):
             self.ec2_resource: boto3.session.Session.resource = boto3.resource(
                 'ec2',
                 aws_access_key_id=config['remote.aws.access_key'],
                 aws_secret_access_key=config['remote.aws.secret_key'],
-                region_name=self.region)
+                region_name=self.region,
+                config=boto_config)
 
         else:
             # This will look for the env variables
-            self.ec2_resource: boto3.session.Session.resource = boto3.resource('ec2', region_name=self.region)
+            self.ec2_resource: boto3.session.Session.resource = boto3.resource(
+                'ec2', region_name=self.region, config=boto_config)
 
         self.ec2_client = self.ec2_resource.meta.client
 
@@ -72,8 +88,6 @@ class AWSTools(InstanceManager):
         self.security_group_prefix: str = internal_conf.get('remote.aws.security_group_prefix', 'csaopt_')
         self.security_group_id: str = ''
 
-        self.worker_count: int = config['remote.aws.worker_count']
-
         worker_ami_key = 'remote.aws.worker_ami'
         broker_ami_key = 'remote.aws.broker_ami'
 
@@ -87,7 +101,7 @@ class AWSTools(InstanceManager):
         self.broker_port = internal_conf.get('broker.defaults.remote_port')
         self.broker_password = config.get('remote.aws.instances.broker_password', None)
         if self.broker_password is None:
-            self.broker_password = random_str(32)
+            self.broker_password = random_token(24)
 
         self.debug_on_cpu = config.get('debug.gpu_simulator', '')
         self.terminate_on_exit = config.get('remote.terminate_on_exit', False)
@@ -100,19 +114,23 @@ class AWSTools(InstanceManager):
             self.existing_instances = existing_instances
 
         self.provision_args: Dict[str, str] = {
-            'broker_image':
-            config.get('remote.aws.broker_ami', internal_conf['remote.aws.broker_ami']),
-            'worker_image':
-            config.get('remote.aws.worker_ami', internal_conf['remote.aws.worker_ami']),
+            'broker_image': self.broker_ami,
+            'worker_image': self.worker_ami,
             'broker_instance_type':
             config.get('remote.aws.broker_instance_type', internal_conf['remote.aws.broker_instance_type']),
             'worker_instance_type':
             config.get('remote.aws.worker_instance_type', internal_conf['remote.aws.worker_instance_type'])
         }
 
-        data_base = internal_conf['remote.aws.userdata_rel_path']
-        with open(data_base + '-broker.sh', 'rb') as broker_data, open(data_base + '-worker.sh', 'rb') as worker_data:
-            self.user_data_scripts: Dict[str, bytes] = {'broker': broker_data.read(), 'worker': worker_data.read()}
+        self.userdata_base = os.path.abspath(internal_conf['remote.aws.userdata_rel_path'])
+
+    @property
+    def user_data_scripts(self) -> Dict[str, bytes]:
+        """User-data scripts for broker and worker instances, which are only read from disk when first needed"""
+        return {
+            'broker': _read_userdata_script(self.userdata_base + '-broker.sh'),
+            'worker': _read_userdata_script(self.userdata_base + '-worker.sh')
+        }
 
     def _get_from_ids(self, broker_id: str, worker_ids: List[str]) -> Tuple[Any, Any]:
         broker = self.ec2_resource.Instance(broker_id)
@@ -140,6 +158,8 @@ class AWSTools(InstanceManager):
             SecurityGroupIds=[self.security_group_id],
             InstanceType=kwargs['broker_instance_type'])[0]
 
+        # Workers cannot be requested concurrently with the broker: their user-data needs the broker's private IP,
+        # which is only known once create_instances returned for the broker.
         worker_userdata = _interpolate_userscript_template_vals(
             self.user_data_scripts['worker'],
             debug='1' if self.debug_on_cpu else 'off',
@@ -192,15 +212,31 @@ class AWSTools(InstanceManager):
         Args:
             timeout_ms: Timeout, in milliseconds, for the termination
         """
-        instance_ids = [self.broker.id] + [instance.id for instance in self.workers]
-        self.ec2_client.terminate_instances(InstanceIds=instance_ids)
+        self.ec2_client.terminate_instances(InstanceIds=self._instance_ids())
+
+    def _instance_ids(self) -> List[str]:
+        return [self.broker.id] + [worker.id for worker in self.workers]
+
+    def _wait_for(self, waiter_name: str, timeout_ms: int) -> None:
+        """Block until all managed instances satisfy the given EC2 waiter
+
+        All instances are polled in a single DescribeInstances call per attempt, so the wait time does not grow with
+        the number of workers.
+
+        Args:
+            waiter_name: Name of the boto3 EC2 waiter, e.g. `instance_running`
+            timeout_ms: Timeout, in milliseconds, after which the waiter gives up
+        """
+        self.ec2_client.get_waiter(waiter_name).wait(
+            InstanceIds=self._instance_ids(),
+            WaiterConfig={
+                'Delay': _waiter_delay_s,
+                'MaxAttempts': max(1, timeout_ms // (_waiter_delay_s * 1000))
+            })
 
     def _wait_for_instances(self) -> None:
         """Block until broker and workers are up"""
-        self.broker.wait_until_running()
-
-        for worker in self.workers:
-            worker.wait_until_running()
+        self._wait_for('instance_running', self.timeout_startup)
 
     def _run_start_scripts(self, timeout_ms: int) -> None:
         """Run any required setup procedures after the initial startup of managed instances
@@ -240,11 +276,11 @@ class AWSTools(InstanceManager):
         self._terminate_instances(self.timeout_provision)
         log.debug('Terminate Instances call returned, waiting for termination')
 
-        all_instances = [self.broker] + self.workers
-        while (any((not _has_exit_status(instance) for instance in all_instances))):
-            log.debug('Waiting for instances to enter "shutting-down" or "terminated" state: {}'.format(
-                [(i.id, i.state) for i in all_instances]))
-            time.sleep(2.0)
+        try:
+            self._wait_for('instance_terminated', self.timeout_provision)
+        except WaiterError as e:
+            # Still try to clean up, removing the group only succeeds once no instance uses it anymore
+            log.error('Instances did not terminate within {}ms: {}'.format(self.timeout_provision, e))
 
         log.debug('Remove Security Group')
         self._remove_sec_group(self.security_group_id)
@@ -269,6 +305,9 @@ class AWSTools(InstanceManager):
     def _create_sec_group(self, name: str) -> str:
         """Creates an AWS security group and assigns ingress permissions from the current network
 
+        No VpcId is passed, so EC2 creates the group in the default VPC of the region, where the instances are launched
+        as well. This saves looking up the VPC via `describe_vpcs` first.
+
         Args:
             name: Name of the security group
 
@@ -49,6 +49,8 @@ class Model:
         functions: Functions modelling the domain
     """
 
+    __slots__ = ('name', 'dimensions', 'distribution', 'precision', 'globals', 'state_shape', 'functions')
+
     @staticmethod
     def from_dict(d: Dict[str, Any]):
         """
@@ -98,4 +100,4 @@ class Model:
         }
 
     def __repr__(self) -> str:
-        return json.dumps(self, indent=4)
+        return json.dumps(self.to_dict(), indent=4)
@@ -111,12 +111,23 @@ class ModelLoader():
             precision,
             distribution,
             opt_globals,
-            len(module.empty_state()),  # type: ignore
+            self._state_shape(module),
             # The model is prepared for sending it to the workers
             # and contains raw source instead of the real python functions
             {f_name: inspect.getsource(functions[f_name])
              for f_name in functions.keys()})
 
+    @staticmethod
+    def _state_shape(module: ModuleType) -> int:
+        """Shape of the optimization state
+
+        Models whose `empty_state` is not a flat sequence, e.g. a tuple of arrays, declare it as `state_shape`.
+        """
+        state_shape = getattr(module, 'state_shape', None)
+        if state_shape is not None:
+            return int(state_shape)
+        return len(module.empty_state())  # type: ignore
+
     def _extract_functions(self, module: ModuleType) -> Dict[str, Callable]:
         """Extracts required functions from the intermediate python module
 
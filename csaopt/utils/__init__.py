@@ -1,16 +1,37 @@
+import copy
 import socket
 import string
-import requests
 import os
+import random
+import re
+import secrets
 import logging
-
-from typing import Optional
-from random import choice, randint
+import hashlib
+import json
+import tempfile
+import threading
+import time
+
+from collections import OrderedDict
+from functools import wraps
+from typing import Any, Callable, Dict, Optional, Tuple
 from pyhocon import ConfigFactory
 from pyhocon.config_tree import ConfigTree
 
 log = logging.getLogger(__name__)
 
+_CHARS = string.ascii_letters + string.digits
+
+# Parsed configs of this process, keyed by absolute path and modification time
+_CFG_CACHE = OrderedDict()  # type: OrderedDict
+_CFG_CACHE_SIZE = 64
+# get_configs is called from executor threads
+_CFG_CACHE_LOCK = threading.Lock()
+# Configs containing any of these keys are never written to the on-disk cache
+_CREDENTIAL_KEYS = frozenset(('access_key', 'secret_key', 'password', 'broker_password'))
+# Conservative, a value merely containing the word only costs a cache miss
+_INCLUDE_RE = re.compile(r'\binclude\b')
+
 
 def docker_available() -> bool:
     try:
@@ -26,15 +47,44 @@ def is_pytest_run() -> bool:
 
 
 def random_int(lower: int, upper: int) -> int:
-    return randint(lower, upper)
+    return random.randint(lower, upper)
 
 
 def random_str(length: int) -> str:
     """
     Generates a random string using ascii letters and digits
     """
-    chars = string.ascii_letters + string.digits
-    return ''.join(choice(chars) for x in range(length))
+    return ''.join(random.choices(_CHARS, k=length))
+
+
+def random_token(nbytes: int) -> str:
+    """
+    Generates a cryptographically secure, url-safe random string from nbytes random bytes
+    """
+    return secrets.token_urlsafe(nbytes)
+
+
+def _ttl_cache(seconds: float) -> Callable:
+    """Memoize a function of hashable arguments, recomputing results that are older than `seconds`"""
+
+    def decorator(fun: Callable) -> Callable:
+        cache = {}  # type: Dict[Tuple, Tuple[float, Any]]
+
+        @wraps(fun)
+        def wrapper(*args, **kwargs):
+            key = (args, tuple(sorted(kwargs.items())))
+            hit = cache.get(key)
+            now = time.monotonic()
+            if hit is not None and now - hit[0] < seconds:
+                return hit[1]
+            result = fun(*args, **kwargs)
+            cache[key] = (now, result)
+            return result
+
+        setattr(wrapper, 'cache_clear', cache.clear)
+        return wrapper
+
+    return decorator
 
 
 def internet_connectivity_available(host: str = "8.8.8.8", port: int = 53, timeout_seconds: float = 3.0) -> bool:
@@ -46,19 +96,110 @@ def internet_connectivity_available(host: str = "8.8.8.8", port: int = 53, timeo
     OpenPort: 53/tcp
     Service: domain (DNS/TCP)
     Source: https://stackoverflow.com/a/33117579/2822762
+
+    Results are cached for 30 seconds. Setting CSAOPT_ASSUME_ONLINE=1 skips the check.
     """
+    if os.environ.get('CSAOPT_ASSUME_ONLINE') == '1':
+        return True
+    return _probe_connectivity(host, port, timeout_seconds)
+
+
+@_ttl_cache(seconds=30)
+def _probe_connectivity(host: str, port: int, timeout_seconds: float) -> bool:
     try:
-        socket.setdefaulttimeout(timeout_seconds)
-        socket.socket(socket.AF_INET, socket.SOCK_STREAM).connect((host, port))
+        with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+            sock.settimeout(timeout_seconds)
+            sock.connect((host, port))
         return True
     except Exception as e:
-        log.exception('Exception in internet_connectivity_available()')
+        log.debug('Connectivity check failed: {}'.format(e))
         return False
 
 
+def _config_cache_path(conf_path: str) -> str:
+    """Path of the on-disk cache entry for a config file
+
+    The key is derived from the absolute path, modification time and size of the file, so that any change of the file
+    results in a cache miss.
+    """
+    stat = os.stat(conf_path)
+    key = '{}:{}:{}'.format(os.path.abspath(conf_path), stat.st_mtime, stat.st_size)
+    cache_dir = os.path.join(os.environ.get('XDG_CACHE_HOME', os.path.expanduser('~/.cache')), 'csaopt')
+    return os.path.join(cache_dir, hashlib.blake2b(key.encode()).hexdigest() + '.json')
+
+
 def get_configs(conf_path: str) -> Optional[ConfigTree]:
-    """Parse a hocon file into a ConfigTree"""
-    return ConfigFactory.parse_file(conf_path)
+    """Parse a hocon file into a ConfigTree
+
+    Parsed configs are cached in memory and on disk as JSON, so that unchanged files do not need to be parsed again
+    within a process or on subsequent runs. Configs using substitutions or includes, quoted keys containing dots or
+    credentials are not cached on disk. Setting CSAOPT_NO_CONFIG_CACHE=1 disables the on-disk cache altogether. Callers
+    get their own copy of the config tree and are free to modify it.
+    """
+    abs_path = os.path.abspath(conf_path)
+    key = (abs_path, os.stat(abs_path).st_mtime_ns)
+    with _CFG_CACHE_LOCK:
+        hit = _CFG_CACHE.get(key)
+        if hit is not None:
+            _CFG_CACHE.move_to_end(key)
+    if hit is not None:
+        return copy.deepcopy(hit)
+
+    conf = _load_config(conf_path)
+    with _CFG_CACHE_LOCK:
+        _CFG_CACHE[key] = conf
+        if len(_CFG_CACHE) > _CFG_CACHE_SIZE:
+            _CFG_CACHE.popitem(last=False)
+    return copy.deepcopy(conf)
+
+
+def _contains_credentials(conf: dict) -> bool:
+    for key, val in conf.items():
+        if key in _CREDENTIAL_KEYS or (isinstance(val, dict) and _contains_credentials(val)):
+            return True
+    return False
+
+
+def _has_dotted_keys(conf: dict) -> bool:
+    # ConfigFactory.from_dict would split such keys into nested trees when reading the cache entry
+    for key, val in conf.items():
+        if '.' in key or (isinstance(val, dict) and _has_dotted_keys(val)):
+            return True
+    return False
+
+
+def _load_config(conf_path: str) -> ConfigTree:
+    with open(conf_path, 'r') as conf_file:
+        text = conf_file.read()
+    # Substitutions can resolve differently in the next process, e.g. when they refer to environment variables, and
+    # included files can change without the cache key of the including file changing
+    cacheable = (os.environ.get('CSAOPT_NO_CONFIG_CACHE') != '1' and '${' not in text
+                 and _INCLUDE_RE.search(text) is None)
+
+    cache_path = _config_cache_path(conf_path)
+    if cacheable:
+        try:
+            with open(cache_path, 'r') as cache_file:
+                return ConfigFactory.from_dict(json.load(cache_file))
+        except (OSError, ValueError):
+            pass
+
+    conf = ConfigFactory.parse_file(conf_path)
+    plain_conf = conf.as_plain_ordered_dict()
+    if not cacheable or _contains_credentials(plain_conf) or _has_dotted_keys(plain_conf):
+        return conf
+
+    try:
+        serialized = json.dumps(plain_conf)
+        os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+        # Write to a temporary file first, concurrent readers should never see a partially written entry
+        with tempfile.NamedTemporaryFile('w', dir=os.path.dirname(cache_path), delete=False) as tmp_file:
+            tmp_file.write(serialized)
+        os.replace(tmp_file.name, cache_path)
+    except (OSError, TypeError) as e:
+        log.debug('Could not cache config {}: {}'.format(conf_path, e))
+
+    return conf
 
 
 def get_free_tcp_port() -> Optional[int]:
@@ -1,112 +1,454 @@
 import math
+import numpy as np
 
-from typing import List, Tuple, MutableSequence, Sequence, Collection, Any
+from functools import lru_cache
+from typing import NamedTuple, Sequence, Any, List, Tuple
 
-from csaopt.utils import clamp
+from csaopt.utils import FakeCuda, clamp
+
+# numba is optional, without it the kernels run as plain python and the CUDA kernel is unavailable
+cuda: Any = FakeCuda
+njit: Any = FakeCuda.jit
+prange: Any = range
+types: Any = None
+try:
+    from numba import cuda, njit, prange, types
+except ImportError:
+    pass
+
+
+class Chain2d(NamedTuple):
+    """Chain on the 2D lattice, stored as a structure of arrays
+
+    xs and ys are the lattice coordinates of each monomer. dirs holds a single uint64 word in which bits [2i, 2i + 2)
+    encode the direction (0: east, 1: north, 2: west, 3: south) from monomer i to monomer i + 1.
+    """
+    xs: np.ndarray
+    ys: np.ndarray
+    dirs: np.ndarray
 
-Monomer = Tuple[int, int, int, int]
-Chain2d = List[Monomer]
 
 # -- Globals
 
 hp_str = 'PHHPPHPHPPHPHPHPPHPPHHHHH'
 eps = -1
+max_steps = 10000
 h_idxs = [idx for idx, mm in enumerate(hp_str) if mm == 'H']
+N = len(hp_str)
+# The state is a chain of N monomers, even though it is stored as a tuple of arrays
+state_shape = N
+NUM_H = len(h_idxs)
+H_IDX_NP = np.asarray(h_idxs, dtype=np.int32)
+# Only H monomers which are at least 3 apart in the sequence can be in contact. Being an upper triangular mask, this
+# also ensures that each pair is only counted once.
+contact_candidates = (H_IDX_NP[None, :] - H_IDX_NP[:, None]) >= 3
+# The same pairs as monomer indices, for the jitted energy
+CONTACT_PAIRS = H_IDX_NP[np.argwhere(contact_candidates)]
+
+EMPTY_XS = np.zeros(N, dtype=np.int8)
+EMPTY_YS = np.zeros(N, dtype=np.int8)
+EMPTY_DIRS = np.zeros(1, dtype=np.uint64)
+
+# Lattice offsets for each direction
+DX = np.array([1, 0, -1, 0], dtype=np.int8)
+DY = np.array([0, 1, 0, -1], dtype=np.int8)
+
+# Directions are packed 2 bits per monomer into a single word
+assert N <= 32, 'Packed directions only fit chains of up to 32 monomers'
+LO_BITS = np.uint64(0x5555555555555555)
+HI_BITS = np.uint64(0xAAAAAAAAAAAAAAAA)
+CHAIN_BITS = np.uint64((1 << (2 * N)) - 1)
+
+
+# A chain of n monomers fits into a (2n + 1) x (2n + 1) window around its first monomer. This is the scratch grid
+# used for the overlap check, which is kept empty between calls.
+GRID_SIZE = (2 * N + 1)**2
+occupancy_grid = np.zeros(GRID_SIZE, dtype=np.bool_)
+
+
+@njit(inline='always')
+def _lattice_key(xs, ys, i, n):
+    return (int(xs[i]) - int(xs[0]) + n) * (2 * n + 1) + (int(ys[i]) - int(ys[0]) + n)
+
+
+@njit(cache=True)
+def _valid(xs, ys, occupied) -> bool:
+    # lattice coordinates are integers, so a chain overlaps iff two monomers occupy the same grid cell
+    n = N
+    valid = True
+    inserted = 0
+    for i in range(n):
+        key = _lattice_key(xs, ys, i, n)
+        if occupied[key]:
+            valid = False
+            break
+        occupied[key] = True
+        inserted += 1
 
+    # leave the grid empty for the next check
+    for i in range(inserted):
+        occupied[_lattice_key(xs, ys, i, n)] = False
+    return valid
 
-# @numba.cuda.jit(inline=True, device=True)
-def is_valid_conformation(chain: Chain2d) -> bool:
-    row_max = len(chain)
-    for i in range(row_max):
-        for j in range(i + 1, row_max):
-            d = (chain[i][1] - chain[j][1])**2 + (chain[i][2] - chain[j][2])**2
-            if d < 1.0:
+
+@njit(inline='always')
+def _valid_moved(xs, ys, lo, hi) -> bool:
+    # only monomers lo..hi - 1 moved, so it suffices to check these against every other monomer
+    for i in range(lo, hi):
+        for j in range(N):
+            if j != i and xs[i] == xs[j] and ys[i] == ys[j]:
                 return False
     return True
 
 
+@njit(inline='always')
+def _valid_split(xs, ys, split, occupied) -> bool:
+    """Check a chain whose monomers before and after split are each known not to overlap among themselves
+
+    The smaller part is put into the occupancy grid and the larger part probed against it.
+    """
+    if split <= N - split:
+        ins_lo, ins_hi, probe_lo, probe_hi = 0, split, split, N
+    else:
+        ins_lo, ins_hi, probe_lo, probe_hi = split, N, 0, split
+    for i in range(ins_lo, ins_hi):
+        occupied[_lattice_key(xs, ys, i, N)] = True
+
+    valid = True
+    for i in range(probe_lo, probe_hi):
+        if occupied[_lattice_key(xs, ys, i, N)]:
+            valid = False
+            break
+
+    for i in range(ins_lo, ins_hi):
+        occupied[_lattice_key(xs, ys, i, N)] = False
+    return valid
+
+
+def is_valid_conformation(chain: Chain2d) -> bool:
+    return _valid(chain.xs, chain.ys, occupancy_grid)
+
+
+@njit(inline='always')
+def _dir_at(word, i):
+    return (word >> np.uint64(2 * i)) & np.uint64(3)
+
+
+@njit(inline='always')
+def _rebuild_positions(word, xs, ys) -> None:
+    # Walk the chain from its (fixed) first monomer along the directions
+    for k in range(1, len(xs)):
+        d = _dir_at(word, k - 1)
+        xs[k] = xs[k - 1] + DX[d]
+        ys[k] = ys[k - 1] + DY[d]
+
+
+def pack_dirs(dirs: Sequence[int]) -> np.ndarray:
+    word = 0
+    for i, d in enumerate(dirs):
+        word |= (int(d) & 3) << (2 * i)
+    return np.array([word], dtype=np.uint64)
+
+
+def unpack_dirs(chain: Chain2d) -> np.ndarray:
+    word = int(chain.dirs[0])
+    return np.array([(word >> (2 * i)) & 3 for i in range(N)], dtype=np.int8)
+
+
 # -- Globals
 
 
-def empty_state() -> Collection:
-    return [(0, 0, 0, 0)] * len(hp_str)
+def empty_state() -> Chain2d:
+    return Chain2d(EMPTY_XS.copy(), EMPTY_YS.copy(), EMPTY_DIRS.copy())
+
+
+@lru_cache(maxsize=8)
+def _cooling_schedule(initial_temp: float) -> np.ndarray:
+    return initial_temp * (0.97**np.arange(max_steps, dtype=np.float64))
 
 
 def cool(initial_temp: float, old_temp: float, step: int) -> float:
+    if step < max_steps:
+        return _cooling_schedule(initial_temp)[step]
     return initial_temp * math.pow(0.97, step)
 
 
+@njit(inline='always')
+def _accept(e_old, e_new, temp, log_rnd) -> bool:
+    # exp((e_old - e_new) / temp) > rnd, compared in log space so neither exp nor a division is needed. Drivers that
+    # draw their randoms in bulk take the logs in the same pass.
+    return (e_old - e_new) > temp * log_rnd
+
+
 def acceptance_func(e_old: float, e_new: float, temp: float, rnd: float) -> float:
+    # The worker passes a plain uniform random, taking its log here would only trade the exp for a log.
     # prevent math.exp from under or overflowing, we can anyway constrain 0 < e^x <= (e^0 == 1)
     x = clamp(-80, (e_old - e_new) / temp, 0.1)
     return math.exp(x) > rnd
 
 
-def initialize(state: MutableSequence, randoms: Sequence[float]) -> None:
-    generate_next(state, state, randoms, 0)  # just delegate to generate_next
-
+def initialize(state: Chain2d, randoms: Sequence[float]) -> None:
+    # Start from a straight chain and delegate to generate_next
+    straight = empty_state()
+    _rebuild_positions(straight.dirs[0], straight.xs, straight.ys)
+    generate_next(straight, state, randoms, 0)
 
-def evaluate(state: Sequence) -> float:
-    num_hs = len(h_idxs)
-    num_contacts = 0
-    # contacts: List[Tuple[int, int]] = []
-    for i in range(num_hs):
-        for j in range(i + 1, num_hs):
-            h2 = h_idxs[j]
-            h1 = h_idxs[i]
-            if (h2 - h1) >= 3:
-                # if the distance between the two hydrophobic monomers is greater than 3, they could be in contact
-                d = float(state[h1][1] - state[h2][1])**2 +\
-                    float(state[h1][2] - state[h2][2])**2  # euclidean distance
-                if d < 1.05:  # if the distance is one, they are in contact
-                    num_contacts += 1
 
-    return num_contacts * eps
+def _contact_mask(state: Chain2d) -> np.ndarray:
+    # int8 would overflow when squaring the differences, int16 holds the largest possible 2 * (N - 1)**2
+    hx = state.xs[H_IDX_NP].astype(np.int16)
+    hy = state.ys[H_IDX_NP].astype(np.int16)
+    d = (hx[:, None] - hx[None, :])**2 + (hy[:, None] - hy[None, :])**2  # squared euclidean distance of all pairs
+    # on the lattice, monomers are in contact iff their squared distance is exactly one
+    return contact_candidates & (d == 1)
 
 
-def rigid_rotation(chain: Chain2d, idx: int = 0, clckwise: bool = False):
-    rot = 1 if clckwise else -1
+def evaluate(state: Chain2d) -> float:
+    return int(np.count_nonzero(_contact_mask(state))) * eps
 
-    # Mutate the rest of the chain by the chosen rotation, starting from idx
-    for i in range(idx, len(chain)):
-        chain[i][3] = (chain[i][3] + rot) % 4  # type: ignore
 
+def contacts(state: Chain2d) -> List[Tuple[int, int]]:
+    """Indices of all H monomer pairs in contact"""
+    return [(int(H_IDX_NP[i]), int(H_IDX_NP[j])) for i, j in np.argwhere(_contact_mask(state))]
 
-def crankshaft(chain: Chain2d, idx: int):
-    tmp1 = chain[idx][3]
-    tmp2 = chain[idx + 2][3]
-    if tmp1 != tmp2:
-        chain[idx][3] = tmp2  # type: ignore
-        chain[idx + 2][3] = tmp1  # type: ignore
 
+def to_monomers(state: Chain2d) -> List[List[int]]:
+    """Convert a chain to the per-monomer [is_h, x, y, direction] rows used by render.py"""
+    dirs = unpack_dirs(state)
+    return [[int(hp_str[i] == 'H'), int(state.xs[i]), int(state.ys[i]), int(dirs[i])] for i in range(N)]
 
-def three_bead_flip(chain: Chain2d, idx: int):
-    tmp1 = chain[idx][3]
-    tmp2 = chain[idx + 1][3]
-    if tmp1 != tmp2:
-        chain[idx][3] = tmp2  # type: ignore
-        chain[idx + 1][3] = tmp1  # type: ignore
 
+@njit(inline='always')
+def rigid_rotation(word, xs: np.ndarray, ys: np.ndarray, idx: int = 0, clckwise: bool = False):
+    rot = 1 if clckwise else -1
 
-def generate_next(state: Sequence, new_state: Chain2d, randoms: Sequence[float], step) -> Any:
+    # Mutate the rest of the chain by the chosen rotation, starting from idx. Adding +-1 mod 4 to each 2 bit lane flips
+    # the low bit, the high bit flips if the low bit was set before (+1) or is set afterwards (-1).
+    suffix = CHAIN_BITS & ~((np.uint64(1) << np.uint64(2 * idx)) - np.uint64(1))
+    lo = word & LO_BITS & suffix
+    new_lo = ~word & LO_BITS & suffix
+    carry = lo if clckwise else new_lo
+    word = (word & ~suffix) | ((word & HI_BITS & suffix) ^ (carry << np.uint64(1))) | new_lo
+
+    # which rotates all monomers after idx by 90 degrees around monomer idx
+    px = xs[idx]
+    py = ys[idx]
+    for k in range(idx + 1, len(xs)):
+        dx = xs[k] - px
+        dy = ys[k] - py
+        xs[k] = px - rot * dy
+        ys[k] = py + rot * dx
+    return word
+
+
+@njit(inline='always')
+def _swap_dirs(word, i, j):
+    # xor-swap the 2 bit lanes i and j, which is a no-op if they are equal
+    diff = _dir_at(word, i) ^ _dir_at(word, j)
+    return word ^ ((diff << np.uint64(2 * i)) | (diff << np.uint64(2 * j)))
+
+
+@njit(inline='always')
+def crankshaft(word, xs: np.ndarray, ys: np.ndarray, idx: int):
+    word = _swap_dirs(word, idx, idx + 2)
+    # only the two monomers in between move
+    d0 = _dir_at(word, idx)
+    d1 = _dir_at(word, idx + 1)
+    xs[idx + 1] = xs[idx] + DX[d0]
+    ys[idx + 1] = ys[idx] + DY[d0]
+    xs[idx + 2] = xs[idx + 1] + DX[d1]
+    ys[idx + 2] = ys[idx + 1] + DY[d1]
+    return word
+
+
+@njit(inline='always')
+def three_bead_flip(word, xs: np.ndarray, ys: np.ndarray, idx: int):
+    word = _swap_dirs(word, idx, idx + 1)
+    # only the monomer in between moves
+    d0 = _dir_at(word, idx)
+    xs[idx + 1] = xs[idx] + DX[d0]
+    ys[idx + 1] = ys[idx] + DY[d0]
+    return word
+
+
+@njit(cache=True)
+def _propose(dirs_in, xs_in, ys_in, dirs_out, xs_out, ys_out, randoms, occupied) -> bool:
+    """Mutate the input chain into the output chain until a valid conformation is found
+
+    The output chain is only left mutated if a valid conformation was found within 101 attempts, otherwise it is a copy
+    of the input chain. Moves update the positions incrementally and failed attempts only restore the part of the chain
+    that was touched. The input chain has to be valid, so that only the moved monomers need to be checked for overlaps.
+    """
+    n = N
     len_randoms = len(randoms)
-    n = 0
-    while n <= 100:
-        idx = int(math.floor((len(state) - 1.0001) * randoms[n % len_randoms]))
-        for i in range(len(state)):
-            new_state[i] = state[i]
-
-        if randoms[1] < 0.3 or idx > (len(state) - 3):
+    dirs_out[0] = dirs_in[0]
+    # element-wise, slice assignment needs the NRT allocator, which is not available on CUDA
+    for k in range(n):
+        xs_out[k] = xs_in[k]
+        ys_out[k] = ys_in[k]
+    for attempt in range(101):
+        idx = int(math.floor((n - 1.0001) * randoms[attempt % len_randoms]))
+
+        if randoms[1] < 0.3 or idx > (n - 3):
             # if the vec index is on the end, do an end flip
-            clckwise = randoms[2] < 0.5
-            rigid_rotation(new_state, idx, clckwise=clckwise)
+            word = rigid_rotation(dirs_in[0], xs_out, ys_out, idx, randoms[2] < 0.5)
+            touched_end = n
+            # both the fixed prefix and the rigidly rotated suffix are free of overlaps on their own
+            valid = _valid_split(xs_out, ys_out, idx + 1, occupied)
         elif randoms[1] < 0.66:
             # do a three-bead flip, i.e. switch two adjacent {n,e,w,s} directions
-            crankshaft(new_state, idx)
+            word = crankshaft(dirs_in[0], xs_out, ys_out, idx)
+            touched_end = idx + 3
+            valid = _valid_moved(xs_out, ys_out, idx + 1, idx + 3)
         else:
-            three_bead_flip(new_state, idx)
-
-        if is_valid_conformation(new_state):
-            break
-
-        n += 1
+            word = three_bead_flip(dirs_in[0], xs_out, ys_out, idx)
+            touched_end = idx + 2
+            valid = _valid_moved(xs_out, ys_out, idx + 1, idx + 2)
+
+        if valid:
+            dirs_out[0] = word
+            return True
+
+        for k in range(idx, touched_end):
+            xs_out[k] = xs_in[k]
+            ys_out[k] = ys_in[k]
+
+    return False
+
+
+def generate_next(state: Chain2d, new_state: Chain2d, randoms: Sequence[float], step) -> Any:
+    return _propose(state.dirs, state.xs, state.ys, new_state.dirs, new_state.xs, new_state.ys,
+                    np.asarray(randoms, dtype=np.float64), occupancy_grid)
+
+
+@njit(cache=True)
+def _energy(xs, ys):
+    contacts = 0
+    for p in range(len(CONTACT_PAIRS)):
+        i = CONTACT_PAIRS[p, 0]
+        j = CONTACT_PAIRS[p, 1]
+        # if the manhattan distance is one, they are in contact
+        if abs(int(xs[i]) - int(xs[j])) + abs(int(ys[i]) - int(ys[j])) == 1:
+            contacts += 1
+    return contacts * eps
+
+
+@njit(cache=True)
+def _chain_loop(dirs, xs, ys, randoms, log_randoms, n_steps, init_temp):
+    """Anneal a single chain for n_steps, leaving the best conformation found in dirs, xs and ys
+
+    The chain has to start out in a valid conformation. randoms[step] holds the randoms for the proposal of each step
+    and log_randoms[step] the log of the uniform random used for its acceptance.
+    """
+    occupied = np.zeros(GRID_SIZE, dtype=np.bool_)
+    cur_dirs, cur_xs, cur_ys = dirs.copy(), xs.copy(), ys.copy()
+    new_dirs, new_xs, new_ys = dirs.copy(), xs.copy(), ys.copy()
+    energy = _energy(xs, ys)
+    best = energy
+    temp = init_temp
+    for step in range(n_steps):
+        if _propose(cur_dirs, cur_xs, cur_ys, new_dirs, new_xs, new_ys, randoms[step], occupied):
+            new_energy = _energy(new_xs, new_ys)
+            if _accept(energy, new_energy, temp, log_randoms[step]):
+                cur_dirs, new_dirs = new_dirs, cur_dirs
+                cur_xs, new_xs = new_xs, cur_xs
+                cur_ys, new_ys = new_ys, cur_ys
+                energy = new_energy
+                if energy < best:
+                    best = energy
+                    dirs[:] = cur_dirs
+                    xs[:] = cur_xs
+                    ys[:] = cur_ys
+        # same schedule as cool()
+        temp *= 0.97
+    return best
+
+
+@njit(parallel=True, cache=True)
+def run_chains(dirs_batch, xs_batch, ys_batch, randoms_batch, log_randoms_batch, n_steps, init_temp):
+    """Anneal independent replicas in parallel, one chain per row of the batch arrays
+
+    Returns the best energy of each replica, whose conformation is left in its row of the batch arrays.
+    """
+    n_chains = xs_batch.shape[0]
+    best = np.empty(n_chains, dtype=np.int64)
+    # replicas share no memory, each one gets its own scratch buffers in _chain_loop
+    for r in prange(n_chains):
+        best[r] = _chain_loop(dirs_batch[r], xs_batch[r], ys_batch[r], randoms_batch[r], log_randoms_batch[r],
+                              n_steps, init_temp)
+    return best
+
+
+def anneal(n_chains: int, n_steps: int, initial_temp: float, seed=None) -> Tuple[np.ndarray, List[Chain2d]]:
+    """Anneal n_chains straight chains in parallel for n_steps, returning the best energy and chain of each replica
+
+    All randoms are drawn up front in two bulk calls, (n_chains, n_steps, 4) for the proposals and (n_chains, n_steps)
+    for the acceptance, whose logs are taken in the same pass.
+    """
+    rng = np.random.default_rng(seed)
+    randoms = rng.random((n_chains, n_steps, 4), dtype=np.float64)
+    # 1 - u lies in (0, 1], so the log is always finite
+    log_randoms = np.log1p(-rng.random((n_chains, n_steps), dtype=np.float64))
+
+    xs_batch = np.zeros((n_chains, N), dtype=np.int8)
+    ys_batch = np.zeros((n_chains, N), dtype=np.int8)
+    dirs_batch = np.zeros((n_chains, 1), dtype=np.uint64)
+    for r in range(n_chains):
+        _rebuild_positions(dirs_batch[r, 0], xs_batch[r], ys_batch[r])
+
+    best = run_chains(dirs_batch, xs_batch, ys_batch, randoms, log_randoms, n_steps, initial_temp)
+    return best, [Chain2d(xs_batch[r], ys_batch[r], dirs_batch[r]) for r in range(n_chains)]
+
+
+# The CUDA target compiles the njit functions above into device functions when they are called from a kernel, so the
+# kernel shares the proposal, energy and acceptance code with the CPU driver.
+@cuda.jit()
+def anneal_kernel(dirs_all, xs_all, ys_all, randoms_all, log_randoms_all, best_energy, n_steps, init_temp):
+    """Anneal one replica per thread, writing only its best energy back to global memory"""
+    tid = cuda.grid(1)
+    if tid >= xs_all.shape[0]:
+        return
+
+    occupied = cuda.local.array(GRID_SIZE, types.boolean)
+    cur_dirs = cuda.local.array(1, types.uint64)
+    cur_xs = cuda.local.array(N, types.int8)
+    cur_ys = cuda.local.array(N, types.int8)
+    new_dirs = cuda.local.array(1, types.uint64)
+    new_xs = cuda.local.array(N, types.int8)
+    new_ys = cuda.local.array(N, types.int8)
+
+    # local arrays are not initialized
+    for i in range(GRID_SIZE):
+        occupied[i] = False
+    cur_dirs[0] = dirs_all[tid, 0]
+    for k in range(N):
+        cur_xs[k] = xs_all[tid, k]
+        cur_ys[k] = ys_all[tid, k]
+
+    energy = _energy(cur_xs, cur_ys)
+    best = energy
+    temp = init_temp
+    for step in range(n_steps):
+        if _propose(cur_dirs, cur_xs, cur_ys, new_dirs, new_xs, new_ys, randoms_all[tid, step], occupied):
+            new_energy = _energy(new_xs, new_ys)
+            if _accept(energy, new_energy, temp, log_randoms_all[tid, step]):
+                cur_dirs, new_dirs = new_dirs, cur_dirs
+                cur_xs, new_xs = new_xs, cur_xs
+                cur_ys, new_ys = new_ys, cur_ys
+                energy = new_energy
+                # no builtin min, numba's CUDA target resolves it to the iterable overload
+                if energy < best:
+                    best = energy
+        temp *= 0.97
+    best_energy[tid] = best
+
+
+def anneal_cuda(dirs_batch, xs_batch, ys_batch, randoms_batch, log_randoms_batch, n_steps, init_temp,
+                threads_per_block=128) -> np.ndarray:
+    """Same as run_chains, but on the GPU and only returning the best energy of each replica"""
+    n_chains = xs_batch.shape[0]
+    best = np.empty(n_chains, dtype=np.int64)
+    blocks = (n_chains + threads_per_block - 1) // threads_per_block
+    anneal_kernel[blocks, threads_per_block](dirs_batch, xs_batch, ys_batch, randoms_batch, log_randoms_batch, best,
+                                             n_steps, float(init_temp))
+    return best
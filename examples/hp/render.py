@@ -6,6 +6,7 @@ import multiprocessing
 
 from typing import List, Tuple
 
+# One [is_h, x, y, direction] row per monomer, see hp_opt.to_monomers
 Chain = List[List[int]]
 
 
@@ -46,7 +46,7 @@ setup(
         'License :: MIT',
         'Natural Language :: English',
         'Operating System :: GNU/Linux',
-        'Programming Language :: Python :: 3.6',
+        'Programming Language :: Python :: 3.7',
     ],
     keywords='cli',
     packages=find_packages(exclude=['docs', 'tests*']),
@@ -0,0 +1,7 @@
+import pytest
+
+
+@pytest.fixture(autouse=True)
+def config_cache_dir(tmpdir, monkeypatch):
+    # keep the on-disk config cache of get_configs out of the developer's home directory
+    monkeypatch.setenv('XDG_CACHE_HOME', str(tmpdir.join('cache')))
@@ -2,6 +2,7 @@ import pytest
 import responses
 import base64
 
+from botocore.exceptions import WaiterError
 from moto import mock_ec2
 from pyhocon import ConfigFactory
 from context import AWSTools, AppContext, ConsolePrinter, Instance
@@ -129,6 +130,18 @@ def test_context_manager(context):
                 assert instance.state['Name'] == 'terminated'
 
 
+def test_exit_removes_sec_group_after_waiter_timeout(awstools, mocker):
+    awstools.terminate_on_exit = True
+    awstools.security_group_id = 'sg-1234'
+    mocker.patch.object(awstools, '_terminate_instances')
+    mocker.patch.object(
+        awstools, '_wait_for', side_effect=WaiterError(name='InstanceTerminated', reason='timeout', last_response={}))
+    remove_sec_group = mocker.patch.object(awstools, '_remove_sec_group')
+
+    assert awstools.__exit__(None, None, None) is False
+    remove_sec_group.assert_called_once_with('sg-1234')
+
+
 def test_instance_ip():
     instance = Instance('id', '192.168.0.1')
 
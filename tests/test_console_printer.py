@@ -0,0 +1,39 @@
+import context  # noqa
+import pytest
+
+from pyhocon import ConfigFactory
+from sty import fg, rs
+from context import ConsolePrinter
+
+
+@pytest.fixture
+def printer():
+    return ConsolePrinter(ConfigFactory.from_dict({'console': {'width_max': 80, 'width_default': 80}}))
+
+
+def test_format_to_width_pads():
+    formatted = ConsolePrinter._format_to_width(20, 'Loading', 'Done.')
+
+    assert formatted == 'Loading' + ' ' * 8 + 'Done.'
+
+
+def test_format_to_width_ignores_escape_sequences():
+    formatted = ConsolePrinter._format_to_width(20, fg.red + 'Loading' + rs.all, fg.green + 'Done.')
+
+    assert len(ConsolePrinter._remove_special_seqs(formatted)) == 20
+    assert formatted.endswith(fg.green + 'Done.')
+
+
+def test_format_to_width_truncates():
+    formatted = ConsolePrinter._format_to_width(20, 'Loading a very long text', 'Done.')
+
+    assert formatted == 'Loading a v... Done.'
+
+
+def test_spinner_success_without_tty(printer, capsys):
+    printer.print_with_spinner('Waiting for workers to join')
+    printer.println('Worker 1 joined')
+    printer.spinner_success()
+
+    lines = [ConsolePrinter._remove_special_seqs(line) for line in capsys.readouterr().out.split('\n')]
+    assert lines[:2] == ['Worker 1 joined', 'Waiting for workers to join Done.']
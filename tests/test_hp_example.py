@@ -0,0 +1,99 @@
+import importlib.util
+import random
+import sys
+
+import numpy as np
+import pytest
+
+
+@pytest.fixture(scope='module')
+def hp():
+    spec = importlib.util.spec_from_file_location('hp_opt', 'examples/hp/hp_opt.py')
+    module = importlib.util.module_from_spec(spec)
+    # numba's on-disk cache looks the module up by name
+    sys.modules['hp_opt'] = module
+    spec.loader.exec_module(module)
+    yield module
+    sys.modules.pop('hp_opt', None)
+
+
+def _positions(hp, chain):
+    xs = np.zeros(hp.N, dtype=np.int8)
+    ys = np.zeros(hp.N, dtype=np.int8)
+    xs[0], ys[0] = chain.xs[0], chain.ys[0]
+    for k, d in enumerate(hp.unpack_dirs(chain)[:hp.N - 1], start=1):
+        xs[k] = xs[k - 1] + hp.DX[d]
+        ys[k] = ys[k - 1] + hp.DY[d]
+    return xs, ys
+
+
+def _overlaps(chain):
+    return len(set(zip(chain.xs.tolist(), chain.ys.tolist()))) != len(chain.xs)
+
+
+def _energy(hp, chain):
+    contacts = 0
+    for a, i in enumerate(hp.h_idxs):
+        for j in hp.h_idxs[a + 1:]:
+            if j - i >= 3 and abs(int(chain.xs[i]) - int(chain.xs[j])) + abs(int(chain.ys[i]) - int(chain.ys[j])) == 1:
+                contacts += 1
+    return contacts * hp.eps
+
+
+def _copy(hp, chain):
+    return hp.Chain2d(chain.xs.copy(), chain.ys.copy(), chain.dirs.copy())
+
+
+def test_pack_unpack_dirs(hp):
+    rnd = random.Random(1)
+    dirs = [rnd.randrange(4) for _ in range(hp.N)]
+    chain = hp.Chain2d(hp.EMPTY_XS, hp.EMPTY_YS, hp.pack_dirs(dirs))
+    assert hp.unpack_dirs(chain).tolist() == dirs
+
+
+def test_validity_matches_brute_force(hp):
+    # random walks of this length almost always overlap, the valid case is covered by the proposals below
+    rnd = random.Random(2)
+    for _ in range(200):
+        chain = hp.empty_state()
+        chain.dirs[0] = hp.pack_dirs([rnd.randrange(4) for _ in range(hp.N)])[0]
+        hp._rebuild_positions(chain.dirs[0], chain.xs, chain.ys)
+        xs, ys = _positions(hp, chain)
+        assert np.array_equal(chain.xs, xs) and np.array_equal(chain.ys, ys)
+        assert hp.is_valid_conformation(chain) != _overlaps(chain)
+    assert not hp.occupancy_grid.any()
+
+
+def test_proposals_match_brute_force(hp):
+    rnd = random.Random(3)
+    state = hp.empty_state()
+    hp.initialize(state, [rnd.random() for _ in range(8)])
+    accepted = 0
+    for _ in range(500):
+        new_state = hp.empty_state()
+        found = hp.generate_next(state, new_state, [rnd.random() for _ in range(8)], 0)
+        if not found:
+            # an unsuccessful proposal leaves a copy of the input
+            assert np.array_equal(new_state.xs, state.xs) and np.array_equal(new_state.ys, state.ys)
+            assert new_state.dirs[0] == state.dirs[0]
+            continue
+
+        accepted += 1
+        xs, ys = _positions(hp, new_state)
+        assert np.array_equal(new_state.xs, xs) and np.array_equal(new_state.ys, ys)
+        assert not _overlaps(new_state) and hp.is_valid_conformation(new_state)
+        assert hp.evaluate(new_state) == _energy(hp, new_state)
+        assert hp._energy(new_state.xs, new_state.ys) == _energy(hp, new_state)
+        state = _copy(hp, new_state)
+
+    assert accepted > 0
+    assert not hp.occupancy_grid.any()
+
+
+def test_anneal_returns_valid_chains(hp):
+    energies, chains = hp.anneal(4, 200, 10.0, seed=4)
+    for energy, chain in zip(energies, chains):
+        xs, ys = _positions(hp, chain)
+        assert np.array_equal(chain.xs, xs) and np.array_equal(chain.ys, ys)
+        assert not _overlaps(chain)
+        assert energy == _energy(hp, chain)
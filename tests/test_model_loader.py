@@ -1,5 +1,6 @@
 import pytest
 import imp
+import json
 
 from pyhocon import ConfigFactory
 
@@ -36,6 +37,17 @@ def test_build_model(conf, internal_conf, mocker):
     validator.validate_functions.assert_called_once()
 
 
+def test_model_state_shape(conf, internal_conf, mocker):
+    validator = ModelValidator()
+    validator.validate_functions = mocker.stub(name='validate_functions_stub')
+    conf['model']['path'] = 'examples/hp/hp_opt.py'
+
+    model = ModelLoader(conf, internal_conf, validator).get_model()
+
+    assert model is not None
+    assert model.state_shape == 25
+
+
 def test_validator_has_errors(conf, internal_conf, mocker):
     validator = ModelValidator()
     validator.validate_functions = mocker.Mock(return_value=[ValidationError('this is a test error')])
@@ -98,3 +110,12 @@ def test_model_params(conf, internal_conf, mocker):
     assert Precision.Float32 == model.precision
     assert RandomDistribution.Uniform == model.distribution
     assert 2 == model.dimensions
+
+
+def test_model_repr(conf, internal_conf, mocker):
+    validator = ModelValidator()
+    validator.validate_functions = mocker.stub(name='validate_functions_stub')
+    validator.validate_typing = mocker.stub(name='validate_typing_stub')
+
+    model = ModelLoader(conf, internal_conf, validator).get_model()
+    assert json.loads(repr(model)) == model.to_dict()
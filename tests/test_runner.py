@@ -22,3 +22,15 @@ def test_runner_langermann():
         raise Exception('Runner had failures: %s' % runner.failures)
 
     assert runner.best_value == pytest.approx(0, abs=0.2)
+
+
+def test_runner_shuts_down_executor_on_failure(mocker):
+    ctx = {'internal_conf': get_configs('csaopt/internal/csaopt-internal.conf')}
+    runner = Runner(['examples/ackley/ackley_opt.py'], ['examples/ackley/ackley.conf'], ctx)
+    mocker.patch.object(runner, '_run_async', side_effect=RuntimeError('broker timeout'))
+
+    with pytest.raises(RuntimeError):
+        runner.run()
+
+    with pytest.raises(RuntimeError):
+        runner.executor.submit(print)
@@ -1 +1,113 @@
 import context  # noqa
+import os
+import pytest
+
+import csaopt.utils
+from context import get_configs, internet_connectivity_available
+
+
+@pytest.fixture
+def conf_file(tmpdir, monkeypatch):
+    monkeypatch.delenv('CSAOPT_NO_CONFIG_CACHE', raising=False)
+    # start without configs cached in memory, so that the on-disk cache is exercised
+    monkeypatch.setattr(csaopt.utils, '_CFG_CACHE', csaopt.utils.OrderedDict())
+    conf_file = tmpdir.join('test.conf')
+    conf_file.write('remote { aws { worker_count = 2, region = eu-central-1 } }')
+    return conf_file
+
+
+def test_get_configs_writes_cache(conf_file, tmpdir):
+    conf = get_configs(str(conf_file))
+
+    assert conf['remote.aws.worker_count'] == 2
+    assert len(tmpdir.join('cache', 'csaopt').listdir()) == 1
+
+
+def test_get_configs_reads_cache(conf_file, monkeypatch, mocker):
+    first = get_configs(str(conf_file))
+    monkeypatch.setattr(csaopt.utils, '_CFG_CACHE', csaopt.utils.OrderedDict())
+    parse_file = mocker.patch('csaopt.utils.ConfigFactory.parse_file')
+
+    second = get_configs(str(conf_file))
+
+    parse_file.assert_not_called()
+    assert second == first
+    assert second['remote.aws.region'] == 'eu-central-1'
+
+
+def test_get_configs_does_not_cache_substitutions(conf_file, tmpdir, monkeypatch):
+    conf_file.write('remote { aws { secret = ${?CSAOPT_TEST_SECRET} } }')
+    monkeypatch.setenv('CSAOPT_TEST_SECRET', 'first')
+    assert get_configs(str(conf_file))['remote.aws.secret'] == 'first'
+
+    monkeypatch.setattr(csaopt.utils, '_CFG_CACHE', csaopt.utils.OrderedDict())
+    monkeypatch.setenv('CSAOPT_TEST_SECRET', 'second')
+
+    assert get_configs(str(conf_file))['remote.aws.secret'] == 'second'
+    assert not tmpdir.join('cache', 'csaopt').check()
+
+
+def test_get_configs_does_not_cache_includes(conf_file, tmpdir, monkeypatch):
+    included = tmpdir.join('inc.conf')
+    included.write('remote { aws { worker_count = 2 } }')
+    conf_file.write('include "inc.conf"')
+    assert get_configs(str(conf_file))['remote.aws.worker_count'] == 2
+
+    monkeypatch.setattr(csaopt.utils, '_CFG_CACHE', csaopt.utils.OrderedDict())
+    included.write('remote { aws { worker_count = 4 } }')
+
+    assert get_configs(str(conf_file))['remote.aws.worker_count'] == 4
+    assert not tmpdir.join('cache', 'csaopt').check()
+
+
+def test_get_configs_does_not_cache_credentials(conf_file, tmpdir):
+    conf_file.write('remote { aws { access_key = abc, secret_key = def } }')
+
+    assert get_configs(str(conf_file))['remote.aws.secret_key'] == 'def'
+    assert not tmpdir.join('cache', 'csaopt').check()
+
+
+def test_get_configs_does_not_cache_dotted_keys(conf_file, tmpdir, monkeypatch):
+    conf_file.write('remote { "eu.central" = 1 }')
+    assert get_configs(str(conf_file))['remote."eu.central"'] == 1
+
+    monkeypatch.setattr(csaopt.utils, '_CFG_CACHE', csaopt.utils.OrderedDict())
+
+    assert get_configs(str(conf_file))['remote."eu.central"'] == 1
+    assert not tmpdir.join('cache', 'csaopt').check()
+
+
+def test_get_configs_cache_disabled(conf_file, tmpdir, monkeypatch):
+    monkeypatch.setenv('CSAOPT_NO_CONFIG_CACHE', '1')
+
+    assert get_configs(str(conf_file))['remote.aws.worker_count'] == 2
+    assert not tmpdir.join('cache', 'csaopt').check()
+
+
+def test_get_configs_cache_invalidated_on_change(conf_file):
+    get_configs(str(conf_file))
+
+    conf_file.write('remote { aws { worker_count = 4, region = eu-central-1 } }')
+    stat = os.stat(str(conf_file))
+    os.utime(str(conf_file), (stat.st_atime, stat.st_mtime + 10))
+
+    assert get_configs(str(conf_file))['remote.aws.worker_count'] == 4
+
+
+def test_get_configs_returns_copies(conf_file):
+    first = get_configs(str(conf_file))
+    first['remote']['aws']['worker_count'] = 8
+
+    assert get_configs(str(conf_file))['remote.aws.worker_count'] == 2
+
+
+def test_internet_connectivity_assume_online(monkeypatch):
+    monkeypatch.delenv('CSAOPT_ASSUME_ONLINE', raising=False)
+    csaopt.utils._probe_connectivity.cache_clear()
+    # TEST-NET-1 is not routable, so this caches a failed check
+    assert not internet_connectivity_available(host='192.0.2.1', timeout_seconds=0.01)
+
+    monkeypatch.setenv('CSAOPT_ASSUME_ONLINE', '1')
+
+    assert internet_connectivity_available(host='192.0.2.1', timeout_seconds=0.01)
+    csaopt.utils._probe_connectivity.cache_clear()